@@ -1,22 +1,83 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 import joblib
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
 import json
+import logging
+import socket
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import closing
+from itertools import islice
 from datetime import datetime
 import plotly.graph_objs as go
 import paho.mqtt.client as mqtt
 
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 st.set_page_config(page_title="IoT ML Dashboard", layout="wide")
 
 # -------------------------
 # CONFIG (edit sesuai kebutuhan)
 # -------------------------
-MQTT_BROKER = st.secrets.get("MQTT_BROKER", "broker.hivemq.com")
-MQTT_PORT = int(st.secrets.get("MQTT_PORT", 1883))
-TOPIC_SENSOR = st.secrets.get("TOPIC_SENSOR", "iot/class/session5/sensor")
-TOPIC_OUTPUT = st.secrets.get("TOPIC_OUTPUT", "iot/class/session5/output")
-MODEL_PATH = st.secrets.get("MODEL_PATH", "iot_temp_model.pkl")
+@st.cache_resource
+def load_config():
+    """Read secrets once per process instead of on every rerun."""
+    return {
+        "MQTT_BROKER": st.secrets.get("MQTT_BROKER", "broker.hivemq.com"),
+        "MQTT_PORT": int(st.secrets.get("MQTT_PORT", 1883)),
+        # "tcp" or "websockets" (for brokers/networks that only pass HTTP ports)
+        "MQTT_TRANSPORT": st.secrets.get("MQTT_TRANSPORT", "tcp"),
+        # fixed id = persistent broker session; "" = random id, clean session
+        "MQTT_CLIENT_ID": st.secrets.get("MQTT_CLIENT_ID", ""),
+        "TOPIC_SENSOR": st.secrets.get("TOPIC_SENSOR", "iot/class/session5/sensor"),
+        # "json" = {"temp": .., "hum": ..}; "bin" = two little-endian float32
+        "PAYLOAD_FORMAT": st.secrets.get("PAYLOAD_FORMAT", "json"),
+        # alert payloads; e.g. "1"/"0" if the device firmware expects codes
+        "ALERT_ON": str(st.secrets.get("ALERT_ON", "ALERT_ON")),
+        "ALERT_OFF": str(st.secrets.get("ALERT_OFF", "ALERT_OFF")),
+        "TOPIC_OUTPUT": st.secrets.get("TOPIC_OUTPUT", "iot/class/session5/output"),
+        "MODEL_PATH": st.secrets.get("MODEL_PATH", "iot_temp_model.pkl"),
+        "LOG_MAXLEN": int(st.secrets.get("LOG_MAXLEN", 500)),
+        # SQLite file the feed appends every reading to; "" turns it off
+        "HISTORY_DB": st.secrets.get("HISTORY_DB", "iot_log.db"),
+        # readings older than this many days are deleted; 0 keeps everything
+        "HISTORY_DAYS": float(st.secrets.get("HISTORY_DAYS", 7)),
+    }
+
+CONFIG = load_config()
+MQTT_BROKER = CONFIG["MQTT_BROKER"]
+MQTT_PORT = CONFIG["MQTT_PORT"]
+MQTT_TRANSPORT = CONFIG["MQTT_TRANSPORT"]
+MQTT_CLIENT_ID = CONFIG["MQTT_CLIENT_ID"]
+TOPIC_SENSOR = CONFIG["TOPIC_SENSOR"]
+TOPIC_OUTPUT = CONFIG["TOPIC_OUTPUT"]
+PAYLOAD_FORMAT = CONFIG["PAYLOAD_FORMAT"]
+ALERT_ON = CONFIG["ALERT_ON"].encode()
+ALERT_OFF = CONFIG["ALERT_OFF"].encode()
+MODEL_PATH = CONFIG["MODEL_PATH"]
+LOG_MAXLEN = CONFIG["LOG_MAXLEN"]
+HISTORY_DB = CONFIG["HISTORY_DB"]
+HISTORY_DAYS = CONFIG["HISTORY_DAYS"]
+CHART_WINDOW = 200  # points shown on the chart
+CHART_MAX_POINTS = 100  # above this, average into CHART_BUCKET windows
+CHART_BUCKET = "5s"
+# constant uirevision: the browser keeps the user's zoom/pan across updates
+BASE_LAYOUT = go.Layout(xaxis_title="timestamp", uirevision="logs")
 
 
 # -------------------------
@@ -24,120 +85,551 @@ MODEL_PATH = st.secrets.get("MODEL_PATH", "iot_temp_model.pkl")
 # -------------------------
 @st.cache_resource
 def load_model(path):
-    return joblib.load(path)
+    # numeric arrays are memory-mapped from disk rather than copied into RAM
+    model = joblib.load(path, mmap_mode="r")
+    # batches are small: worker-pool dispatch would cost more than it saves
+    if getattr(model, "n_jobs", None) not in (None, 1):
+        model.n_jobs = 1
+    # the first predict pays one-off import/dispatch setup; do it here
+    n_features = getattr(model, "n_features_in_", 2)
+    model.predict(np.zeros((1, n_features), dtype=np.float32))
+    return model
+
+def compile_tree(model):
+    """Flatten a fitted sklearn tree (or forest of trees) into NumPy arrays.
+
+    Only single-output decision trees and forests that average their trees'
+    class probabilities are compiled; anything else (boosting, bagging, ...)
+    returns None, so callers fall back to ``model.predict``.
+    """
+    tree_models = (DecisionTreeClassifier, RandomForestClassifier, ExtraTreesClassifier)
+    if not isinstance(model, tree_models) or model.n_outputs_ != 1:
+        return None
+    estimators = [model] if isinstance(model, DecisionTreeClassifier) else model.estimators_
+
+    trees = []
+    for est in estimators:
+        t = est.tree_
+        left = t.children_left.copy()
+        right = t.children_right.copy()
+        feature = t.feature.copy()
+        # leaves point to themselves, so every row can take max_depth steps
+        leaves = np.flatnonzero(left == -1)
+        left[leaves] = leaves
+        right[leaves] = leaves
+        feature[leaves] = 0
+        # largest float32 <= threshold: same split for float32 inputs,
+        # half the bytes and no upcast of X during the compare
+        threshold = t.threshold.astype(np.float32)
+        above = threshold > t.threshold
+        threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+        value = t.value[:, 0, :]
+        trees.append({
+            "feature": feature.astype(np.min_scalar_type(t.n_features)),
+            "threshold": threshold,
+            "left": left.astype(np.int32),
+            "right": right.astype(np.int32),
+            "proba": value / value.sum(axis=1, keepdims=True),
+            "depth": t.max_depth,
+        })
+    return {"trees": trees, "classes": model.classes_}
+
+
+def tree_predict(compiled, X):
+    """Predict class labels for a float32 (n, 2) batch with flattened trees."""
+    rows = np.arange(len(X))
+    proba = 0
+    for t in compiled["trees"]:
+        node = np.zeros(len(X), dtype=np.intp)
+        for _ in range(t["depth"]):
+            go_left = X[rows, t["feature"][node]] <= t["threshold"][node]
+            node = np.where(go_left, t["left"][node], t["right"][node])
+        proba = proba + t["proba"][node]
+    return compiled["classes"][np.argmax(proba, axis=1)]
+
+
+@st.cache_resource
+def load_compiled_tree(path):
+    return compile_tree(load_model(path))
 
 try:
     model = load_model(MODEL_PATH)
+    compiled_tree = load_compiled_tree(MODEL_PATH)
     st.success("Model loaded successfully")
 except:
     st.error("Failed to load model. Check MODEL_PATH")
     model = None
+    compiled_tree = None
 
 
 # -------------------------
-# MQTT Simple Fetch Function
+# Batch Predict
 # -------------------------
-def get_latest_message():
-    """Fetch 1 message synchronously. No background thread."""
+def predict_batch(X):
+    """Predict a float32 (n, 2) array of (temp, hum) rows in one model call."""
+    if model is None:
+        return ["N/A"] * len(X)
+    if compiled_tree is not None and not np.isnan(X).any():
+        return list(tree_predict(compiled_tree, X))
+    return list(model.predict(X))
 
-    client = mqtt.Client()
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
 
-    message_store = {"msg": None}
+# -------------------------
+# MQTT Background Feed
+# -------------------------
+# output payload per predicted class (bytes: paho sends them as-is);
+# anything else turns the alert off
+ALERT_BY_CLASS = {"Panas": ALERT_ON}
+ALERT_DEFAULT = ALERT_OFF
+PENDING_MAXLEN = 10000  # readings waiting for the worker; oldest dropped first
+STALE_NS = 5 * 10**9  # pending readings older than this are skipped, not predicted
+BATCH_MAX = 256  # rows per model call
+HISTORY_PRUNE_EVERY = 1000  # batches between HISTORY_DAYS retention passes
+FETCH_WAIT = 1.0  # seconds "Get Data Now" waits for a reading to arrive
+PUBLISH_LIMIT = 5  # alert publishes allowed per PUBLISH_WINDOW seconds
+PUBLISH_WINDOW = 1.0
+# readings are periodic and replaceable: QoS 0, no PUBACK round trip each;
+# alerts are rare state changes the device must not miss: QoS 1
+SENSOR_QOS = 0
+ALERT_QOS = 1
+# readings beyond float32 range (or NaN/inf) can't go through the model
+SENSOR_LIMIT = float(np.finfo(np.float32).max)
+# PAYLOAD_FORMAT "bin": 8 bytes, e.g. struct.pack("<ff", temp, hum)
+SENSOR_STRUCT = struct.Struct("<ff")
+
+
+def open_history(path):
+    """SQLite connection to the reading history, creating the table if needed."""
+    con = sqlite3.connect(path)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS logs"
+        " (timestamp INTEGER, temp REAL, hum REAL, prediction TEXT)"
+    )
+    return con
+
+
+def prune_history(con, days):
+    """Delete readings older than ``days`` days; timestamps are ns."""
+    cutoff = time.time_ns() - int(days * 86400e9)
+    with con:
+        con.execute("DELETE FROM logs WHERE timestamp < ?", (cutoff,))
+
+
+def load_history(path, n):
+    """Last n stored readings as log rows, oldest first."""
+    with closing(open_history(path)) as con:
+        rows = con.execute(
+            "SELECT timestamp, temp, hum, prediction FROM logs"
+            " ORDER BY rowid DESC LIMIT ?",
+            (n,),
+        ).fetchall()
+    return rows[::-1]
+
+
+log = logging.getLogger(__name__)
+
+
+def report_failure(feed, what):
+    """Log the exception being handled and keep it on the feed for the UI."""
+    log.exception("sensor feed: %s failed", what)
+    feed["error"] = f"{what} failed: {sys.exc_info()[1]!r}"
+
+
+def publish_alert(feed, alert, sent):
+    """Publish alert if the rate limit allows; else seconds until a retry."""
+    now = time.monotonic()
+    if len(sent) == PUBLISH_LIMIT and now - sent[0] < PUBLISH_WINDOW:
+        return sent[0] + PUBLISH_WINDOW - now
+    sent.append(now)
+    # retained, so devices that (re)connect get the current state at once
+    info = feed["client"].publish(TOPIC_OUTPUT, alert, qos=ALERT_QOS, retain=True)
+    # with qos > 0 paho queues the message while offline and sends it on
+    # reconnect, even though rc is MQTT_ERR_NO_CONN; only retry when dropped
+    queued = ALERT_QOS > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN
+    if info.rc != mqtt.MQTT_ERR_SUCCESS and not queued:
+        return PUBLISH_WINDOW
+    feed["last_alert"] = alert
+    return None
+
+
+def feed_worker(feed):
+    """Predict readings queued by on_message in batches, off the UI thread."""
+    # hot-loop objects bound once instead of looked up in feed per batch
+    pending, wake, log_rows, ready = feed["pending"], feed["wake"], feed["rows"], feed["ready"]
+    stop = feed["stop"]
+    # sqlite connections belong to the thread that opened them; opened on
+    # first use so a failing file is retried (and reported) per batch
+    history = None
+    batches = 0  # counts towards the next prune_history pass
+    # float32 = dtype internal pohon sklearn, jadi tidak ada cast ulang;
+    # one buffer reused for every batch instead of a new array per call
+    X = np.empty((BATCH_MAX, 2), dtype=np.float32)
+    # publish output – only when the alert state changes; a state held back
+    # by the rate limit is replaced by newer ones, so only the latest goes out
+    wanted, sent = None, deque(maxlen=PUBLISH_LIMIT)
+    while not stop.is_set():
+        retry = None
+        if wanted != feed["last_alert"]:
+            retry = publish_alert(feed, wanted, sent)
+        wake.wait(retry)
+        wake.clear()
+        while pending:
+            # payloads carry no time of their own, so ts is arrival time; a
+            # backlog older than STALE_NS is skipped to keep the UI current
+            stale = time.time_ns() - STALE_NS
+            while pending and pending[0][0] < stale:
+                pending.popleft()
+            batch = [pending.popleft() for _ in range(min(len(pending), BATCH_MAX))]
+            n = len(batch)
+            if not n:
+                break
+            # a failing batch is dropped and reported; the worker keeps going
+            try:
+                X[:n] = [(temp, hum) for _, temp, hum in batch]
+                preds = predict_batch(X[:n])
+            except Exception:
+                report_failure(feed, "prediction")
+                continue
+            # log rows are plain (timestamp, temp, hum, prediction) tuples
+            rows = [(ts, temp, hum, pred) for (ts, temp, hum), pred in zip(batch, preds)]
+            with ready:  # holds feed["lock"]
+                log_rows.extend(rows)
+                feed["seq"] += n
+                ready.notify_all()
+            wanted = ALERT_BY_CLASS.get(preds[-1], ALERT_DEFAULT)
+            try:
+                if HISTORY_DB:
+                    if history is None:
+                        history = open_history(HISTORY_DB)
+                    with history:
+                        history.executemany("INSERT INTO logs VALUES (?, ?, ?, ?)", rows)
+                    # first batch included, so a restart prunes straight away
+                    if HISTORY_DAYS > 0 and batches % HISTORY_PRUNE_EVERY == 0:
+                        prune_history(history, HISTORY_DAYS)
+                    batches += 1
+            except Exception:
+                report_failure(feed, "history write")
+                continue
+            feed["error"] = None
+    if history is not None:
+        history.close()
+
+
+FEED_THREAD = "feed_worker"  # thread name stop_feeds looks for
+
+
+def stop_feed(feed):
+    """Disconnect the feed's client and let its feed_worker thread exit."""
+    feed["stop"].set()
+    feed["wake"].set()
+    feed["client"].disconnect()
+    feed["client"].loop_stop()
+
+
+def stop_feeds():
+    """Stop every running feed, found through its feed_worker thread."""
+    for thread in threading.enumerate():
+        if thread.name == FEED_THREAD:
+            thread.stop_feed()
+
+
+def tune_socket(sock):
+    """Send small alert packets at once instead of waiting on Nagle."""
+    if not isinstance(sock, socket.socket):
+        return  # e.g. the websocket transport wraps its socket
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-    def on_message(c, userdata, msg):
-        message_store["msg"] = msg
 
+@st.cache_resource
+def start_feed():
+    """Subscribe once per process; every session reads the same feed."""
+    # st.cache_resource.clear() drops the cached feed without closing it;
+    # its worker thread is still running, so shut that feed down first
+    stop_feeds()
+    lock = threading.Lock()
+    feed = {
+        "pending": deque(maxlen=PENDING_MAXLEN),
+        "wake": threading.Event(),
+        "stop": threading.Event(),  # set by stop_feeds; feed_worker exits
+        "rows": deque(maxlen=LOG_MAXLEN),
+        "seq": 0,
+        "lock": lock,
+        "ready": threading.Condition(lock),  # notified when rows are added
+        "last_alert": None,
+        "last_payload": None,
+        "error": None,  # last batch failure in feed_worker, shown in the UI
+    }
+    # readings from before a restart come back from the history file; an
+    # unreadable file only costs those, the live feed still starts
+    if HISTORY_DB:
+        try:
+            feed["rows"].extend(load_history(HISTORY_DB, LOG_MAXLEN))
+        except Exception:
+            report_failure(feed, "history load")
+
+    def on_connect(c, userdata, flags, rc):
+        if rc == 0:
+            tune_socket(c.socket())
+            c.subscribe(TOPIC_SENSOR, qos=SENSOR_QOS)
+
+    pending, wake = feed["pending"], feed["wake"]
+
+    def on_message(c, userdata, msg):
+        # runs on paho's network thread: parse only, predict in feed_worker
+        if (msg.retain or msg.dup) and msg.payload == feed["last_payload"]:
+            return  # broker re-delivery of a reading we already queued
+        feed["last_payload"] = msg.payload
+        try:
+            if PAYLOAD_FORMAT == "bin":
+                temp, hum = SENSOR_STRUCT.unpack(msg.payload)
+            else:
+                data = json_loads(msg.payload)
+                temp, hum = float(data.get("temp")), float(data.get("hum"))
+        except (ValueError, TypeError, AttributeError, struct.error):
+            return
+        if not (abs(temp) <= SENSOR_LIMIT and abs(hum) <= SENSOR_LIMIT):
+            return  # NaN, inf or too large for the float32 model input
+        ts = time.time_ns()
+        pending.append((ts, temp, hum))
+        wake.set()
+
+    client = mqtt.Client(
+        client_id=MQTT_CLIENT_ID,
+        clean_session=not MQTT_CLIENT_ID,
+        transport=MQTT_TRANSPORT,
+    )
+    client.on_connect = on_connect
     client.on_message = on_message
-    client.subscribe(TOPIC_SENSOR)
+    # paho reconnects on its own with exponential backoff
+    client.reconnect_delay_set(min_delay=1, max_delay=30)
+    client.connect_async(MQTT_BROKER, MQTT_PORT, 60)
     client.loop_start()
+    feed["client"] = client
+    worker = threading.Thread(target=feed_worker, args=(feed,), name=FEED_THREAD, daemon=True)
+    # runs stop_feed once: from stop_feeds, or at interpreter exit to leave
+    # the broker cleanly; a finalizer that has run is dropped, so cache
+    # clears don't pile up exit hooks the way atexit.register would
+    worker.stop_feed = weakref.finalize(worker, stop_feed, feed)
+    worker.start()
+    return feed
+
+
+def deque_tail(items, n):
+    """Last n entries of a deque, oldest first, without copying the rest."""
+    return list(islice(reversed(items), n))[::-1]
+
+
+def pull_new_rows(feed, wait=0):
+    """Rows the feed produced since this session last pulled.
 
-    # wait max 1 second
-    timeout = datetime.now().timestamp() + 1
-    while datetime.now().timestamp() < timeout:
-        if message_store["msg"] is not None:
-            break
+    With wait > 0, block up to that many seconds for the first new row.
+    """
+    with feed["lock"]:
+        feed["ready"].wait_for(lambda: feed["seq"] != st.session_state.feed_seq, wait)
+        seq = feed["seq"]
+        rows = deque_tail(feed["rows"], max(0, seq - st.session_state.feed_seq))
+    st.session_state.feed_seq = seq
+    return rows
 
-    client.loop_stop()
-    client.disconnect()
 
-    return message_store["msg"]
+feed = start_feed()
+
+
+# -------------------------
+# Session Log Ring Buffer
+# -------------------------
+# one preallocated array per column; prediction is a uint8 label code
+LOG_DTYPES = {"timestamp": np.int64, "temp": np.float64, "hum": np.float64, "prediction": np.uint8}
+
+
+def ring_new(cap):
+    """Empty log holding the last cap rows."""
+    return {
+        "cols": {col: np.empty(cap, dtype=dt) for col, dt in LOG_DTYPES.items()},
+        "labels": {},  # prediction label -> code, in first-seen order
+        "cap": cap,
+        "size": 0,
+        "end": 0,  # index the next row is written to
+    }
+
+
+def ring_extend(ring, rows):
+    """Append (timestamp, temp, hum, prediction) rows, overwriting the oldest once full."""
+    rows = rows[-ring["cap"]:]
+    idx = (ring["end"] + np.arange(len(rows))) % ring["cap"]
+    cols, labels = ring["cols"], ring["labels"]
+    ts, temp, hum, preds = zip(*rows)
+    cols["timestamp"][idx] = ts
+    cols["temp"][idx] = temp
+    cols["hum"][idx] = hum
+    cols["prediction"][idx] = [labels.setdefault(p, len(labels)) for p in preds]
+    ring["end"] = (ring["end"] + len(rows)) % ring["cap"]
+    ring["size"] = min(ring["cap"], ring["size"] + len(rows))
+
+
+def ring_tail(ring, n):
+    """Columns of the last n rows, oldest first."""
+    n = min(n, ring["size"])
+    idx = (ring["end"] - n + np.arange(n)) % ring["cap"]
+    return {col: arr[idx] for col, arr in ring["cols"].items()}
 
 
 # -------------------------
 # Session State
 # -------------------------
 if "logs" not in st.session_state:
-    st.session_state.logs = []
+    st.session_state.logs = ring_new(LOG_MAXLEN)
+if "log_seq" not in st.session_state:
+    st.session_state.log_seq = 0
+if "feed_seq" not in st.session_state:
+    # what the feed already holds (restored history, earlier readings) goes
+    # straight into the log; only rows after this point count as received
+    with feed["lock"]:
+        st.session_state.feed_seq = feed["seq"]
+        held = list(feed["rows"])
+    if held:
+        ring_extend(st.session_state.logs, held)
+        st.session_state.log_seq += len(held)
 
 st.title("IoT ML Realtime Dashboard (Stable Mode)")
 
 
 # -------------------------
-# UI BUTTON – GET NEW DATA
+# DISPLAY DATA
 # -------------------------
-st.subheader("Fetch Latest Sensor Data")
-
-if st.button("Get Data Now"):
-    msg = get_latest_message()
+LOCAL_TZ = datetime.now().astimezone().tzinfo
 
-    if msg is None:
-        st.warning("No new message received from MQTT broker.")
-    else:
-        payload = msg.payload.decode()
-        data = json.loads(payload)
 
-        temp = float(data.get("temp"))
-        hum = float(data.get("hum"))
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def logs_frame(n):
+    """DataFrame of the last n session log rows, timestamps in local time."""
+    ring = st.session_state.logs
+    cols = ring_tail(ring, n)
+    return pd.DataFrame({
+        "timestamp": (
+            pd.to_datetime(cols["timestamp"], unit="ns", utc=True)
+            .tz_convert(LOCAL_TZ)
+            .tz_localize(None)
+        ),
+        "temp": cols["temp"],
+        "hum": cols["hum"],
+        "prediction": pd.Categorical.from_codes(cols["prediction"], categories=list(ring["labels"])),
+    })
 
-        # Predict
-        if model:
-            pred = model.predict([[temp, hum]])[0]
-        else:
-            pred = "N/A"
-
-        # Save to session logs
-        st.session_state.logs.append({
-            "timestamp": ts,
-            "temp": temp,
-            "hum": hum,
-            "prediction": pred
-        })
 
-        st.success(f"Received → Temp={temp}, Hum={hum}, Prediction={pred}")
+def memo_by_seq(key, build):
+    """Rebuild st.session_state[key] only when new log rows have arrived."""
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != st.session_state.log_seq:
+        cached = (st.session_state.log_seq, build())
+        st.session_state[key] = cached
+    return cached[1]
 
-        # publish output (simple)
-        pub = mqtt.Client()
-        pub.connect(MQTT_BROKER, MQTT_PORT, 60)
-        if pred == "Panas":
-            pub.publish(TOPIC_OUTPUT, "ALERT_ON")
-        else:
-            pub.publish(TOPIC_OUTPUT, "ALERT_OFF")
-        pub.disconnect()
 
+logs = st.session_state.logs
 
 # -------------------------
-# DISPLAY DATA
+# PLOT
 # -------------------------
-st.subheader("Live Data Logs")
+if "fig" not in st.session_state:
+    # built once per session; reruns only swap the trace data
+    fig = go.Figure(layout=BASE_LAYOUT)
+    # WebGL traces: one draw call instead of an SVG node per point
+    fig.add_trace(go.Scattergl(mode="lines+markers", name="Temperature"))
+    fig.add_trace(go.Scattergl(mode="lines+markers", name="Humidity"))
+    st.session_state.fig = fig
+
+
+def update_chart():
+    """Load the latest chart window into the session figure's traces."""
+    df = logs_frame(CHART_WINDOW)
+    if len(df) > CHART_MAX_POINTS:
+        # downsample for display only; logs keep every raw reading
+        df = (
+            df.resample(CHART_BUCKET, on="timestamp")[["temp", "hum"]]
+            .mean()
+            .dropna()
+            .reset_index()
+        )
+    fig = st.session_state.fig
+    # markers only help while the points are sparse enough to tell apart
+    mode = "lines" if len(df) > CHART_MAX_POINTS else "lines+markers"
+    with fig.batch_update():
+        fig.update_traces(mode=mode)
+        fig.data[0].x, fig.data[0].y = df["timestamp"], df["temp"]
+        fig.data[1].x, fig.data[1].y = df["timestamp"], df["hum"]
+    return fig
 
-df = pd.DataFrame(st.session_state.logs)
-st.dataframe(df.tail(20))
 
 # -------------------------
-# PLOT
+# UI BUTTON – GET NEW DATA
 # -------------------------
-if not df.empty:
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df["timestamp"], y=df["temp"], mode="lines+markers", name="Temperature"))
-    fig.add_trace(go.Scatter(x=df["timestamp"], y=df["hum"], mode="lines+markers", name="Humidity"))
-    st.plotly_chart(fig, use_container_width=True)
+st.subheader("Fetch Latest Sensor Data")
+
+live = st.toggle("Live update (every 1 s)")
+
+
+# live mode reruns only this fragment every second, not the whole page
+@st.fragment(run_every=1 if live else None)
+def live_panel():
+    """Fetch new rows, then draw the log table and chart."""
+    if feed["error"]:
+        st.error(f"Sensor feed: {feed['error']}")
+    if st.button("Get Data Now") or live:
+        # a click waits briefly for a reading; live ticks never block
+        rows = pull_new_rows(feed, wait=0 if live else FETCH_WAIT)
+
+        if not rows:
+            if not live:
+                st.warning("No new message received from MQTT broker.")
+        else:
+            # Save to session logs (already predicted by feed_worker)
+            ring_extend(st.session_state.logs, rows)
+            st.session_state.log_seq += len(rows)
+
+            _, temp, hum, pred = rows[-1]
+            st.success(f"Received → Temp={temp}, Hum={hum}, Prediction={pred}")
+
+    st.subheader("Live Data Logs")
+    st.dataframe(memo_by_seq("table_cache", lambda: logs_frame(20)))
+
+    if logs["size"]:
+        st.plotly_chart(memo_by_seq("chart_cache", update_chart), use_container_width=True)
+
+
+live_panel()
 
 
 # -------------------------
 # SAVE LOG
 # -------------------------
+def logs_to_csv():
+    """CSV bytes of the session logs, written by Arrow's C++ CSV writer."""
+    table = pa.Table.from_pandas(logs_frame(LOG_MAXLEN), preserve_index=False)
+    # whole seconds, same as the old "%Y-%m-%d %H:%M:%S" export
+    table = table.set_column(0, "timestamp", table["timestamp"].cast(pa.timestamp("s"), safe=False))
+    table = table.set_column(3, "prediction", table["prediction"].cast(pa.string()))
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+def logs_to_parquet():
+    """zstd-compressed Parquet bytes of the session logs."""
+    table = pa.Table.from_pandas(logs_frame(LOG_MAXLEN), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+
 if st.button("Save to CSV"):
-    df.to_csv("log.csv", index=False)
-    st.download_button("Download log.csv", df.to_csv(index=False).encode("utf-8"), "log.csv")
+    csv = memo_by_seq("csv_cache", logs_to_csv)
+    with open("log.csv", "wb") as f:
+        f.write(csv)
+    st.download_button("Download log.csv", csv, "log.csv")
+    # same rows, columnar and compressed: smaller download, types kept
+    st.download_button(
+        "Download log.parquet",
+        memo_by_seq("parquet_cache", logs_to_parquet),
+        "log.parquet",
+        "application/octet-stream",
+    )